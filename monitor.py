@@ -1,13 +1,16 @@
 # monitor.py
 """
 Simple, PEP8-compliant setup script for a future monitoring tool.
-- Prompts for hostname, IPv4 address, and a list of metrics.
+- Takes hostname, IPv4 address, and a list of metrics as options.
+- Prompts for anything missing when run from a terminal.
 - Stores everything in memory and prints it in a formatted way.
 """
 
+import argparse
+import socket
+import sys
 from dataclasses import dataclass, field
-from ipaddress import IPv4Address, AddressValueError
-from typing import List
+from typing import List, Optional
 
 
 @dataclass
@@ -18,6 +21,15 @@ class Target:
     metrics: List[str] = field(default_factory=list)
 
 
+def is_ipv4(text: str) -> bool:
+    """Return True if text is a dotted-quad IPv4 address."""
+    try:
+        socket.inet_pton(socket.AF_INET, text)
+        return True
+    except (OSError, ValueError):  # ValueError: embedded NUL
+        return False
+
+
 def prompt_hostname() -> str:
     """Ask for a non-empty hostname."""
     while True:
@@ -31,12 +43,10 @@ def prompt_ipv4() -> str:
     """Ask for a valid IPv4 address."""
     while True:
         ip_text = input("Enter IPv4 address (e.g., 10.10.30.10): ").strip()
-        try:
-            # Validate; keep as string for display
-            IPv4Address(ip_text)
+        # Validate; keep as string for display
+        if is_ipv4(ip_text):
             return ip_text
-        except AddressValueError:
-            print("That is not a valid IPv4 address. Please try again.")
+        print("That is not a valid IPv4 address. Please try again.")
 
 
 def prompt_metrics() -> List[str]:
@@ -67,12 +77,40 @@ def print_summary(target: Target) -> None:
     print("===============================")
 
 
-def main() -> None:
+def ipv4_arg(text: str) -> str:
+    """argparse type for --ip."""
+    if not is_ipv4(text):
+        raise argparse.ArgumentTypeError(f"not a valid IPv4 address: {text}")
+    return text
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Command-line options; anything left out is prompted for on a TTY."""
+    p = argparse.ArgumentParser(description="System Monitor Setup")
+    p.add_argument("--hostname", help="Hostname to monitor")
+    p.add_argument("--ip", type=ipv4_arg, help="IPv4 address (e.g., 10.10.30.10)")
+    p.add_argument("--metrics", nargs="+",
+                   help="Metrics to track (e.g., cpu-usage disk-0-usage memory-usage)")
+    return p
+
+
+def main(argv: Optional[List[str]] = None) -> None:
     """Main program entry point."""
-    print("=== System Monitor Setup ===")
-    hostname = prompt_hostname()
-    ip_addr = prompt_ipv4()
-    metrics = prompt_metrics()
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    interactive = sys.stdin.isatty()
+
+    if not interactive and not (args.hostname and args.ip):
+        parser.error("--hostname and --ip are required when stdin is not a terminal")
+    if interactive and (args.hostname is None or args.ip is None or args.metrics is None):
+        print("=== System Monitor Setup ===")
+
+    hostname = args.hostname or prompt_hostname()
+    ip_addr = args.ip or prompt_ipv4()
+    if args.metrics is not None:
+        metrics = args.metrics
+    else:
+        metrics = prompt_metrics() if interactive else []
 
     target = Target(hostname=hostname, ip=ip_addr, metrics=metrics)
     print_summary(target)
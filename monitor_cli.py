@@ -10,22 +10,44 @@ Append-only, tenzij --reset.
 import argparse
 import csv
 import datetime as dt
-from dataclasses import dataclass
+import math
+import os
+import re
+import signal
+import sys
+import time
+from array import array
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional, Tuple
-import psutil
+from typing import Any, Dict, List, NamedTuple, Optional, TextIO, Tuple
 
 DEFAULT_DB = Path("metrics.csv")
 TIMESTAMP_FMT = "%Y-%m-%dT%H:%M:%S"
+DEFAULT_INTERVAL = 10.0  # seconds, measure --loop
+DEFAULT_BATCH = 10       # rounds per write, measure --loop
 
 # ---------- Metric functions ----------
+# psutil is imported inside the metric functions so that commands which never
+# measure (show, --help, ...) don't pay for loading it.
+
+# Only the first cpu_percent() call has to block; psutil remembers that sample,
+# so later calls can measure against it with interval=None.
+_CPU_PRIMED = False
+
 def metric_cpu_usage() -> float:
+    import psutil
+    global _CPU_PRIMED
+    if _CPU_PRIMED:
+        return float(psutil.cpu_percent(interval=None))
+    _CPU_PRIMED = True
     return float(psutil.cpu_percent(interval=0.1))
 
 def metric_mem_usage() -> float:
+    import psutil
     return float(psutil.virtual_memory().percent)
 
 def metric_disk0_usage() -> float:
+    import psutil
     return float(psutil.disk_usage("/").percent)
 
 KNOWN_METRICS = {
@@ -35,101 +57,208 @@ KNOWN_METRICS = {
 }
 
 # ---------- Data structures ----------
-@dataclass(frozen=True)
-class Sample:
-    timestamp: dt.datetime
+class Sample(NamedTuple):
+    """One measurement read back from the CSV."""
+    timestamp: int  # epoch seconds
     metric: str
     value: float
 
     def as_row(self) -> Tuple[str, str, str]:
-        return (self.timestamp.strftime(TIMESTAMP_FMT), self.metric, f"{self.value:.3f}")
+        return (format_ts(self.timestamp), self.metric, f"{self.value:.3f}")
+
+# CSV row as written: (epoch timestamp, metric, formatted value)
+Record = Tuple[int, str, str]
+
+# Column-oriented view of the CSV: (epoch timestamps, metrics, values)
+Columns = Tuple[array, List[str], array]
+
+def to_epoch(t: dt.datetime) -> int:
+    return int(t.timestamp())
+
+# Rows share timestamps (one per measure run), so most lookups are cache hits
+@lru_cache(maxsize=1024)
+def format_ts(epoch: int) -> str:
+    return dt.datetime.fromtimestamp(epoch).strftime(TIMESTAMP_FMT)
 
 # ---------- CSV storage helpers ----------
-def ensure_header(file: Path) -> None:
-    if not file.exists() or file.stat().st_size == 0:
-        with file.open("w", newline="") as f:
-            csv.writer(f).writerow(["timestamp", "metric", "value"])
+CSV_HEADER = ("timestamp", "metric", "value")
+
+# Append handles stay open across append_records() calls, one per CSV path
+_writer_cache: Dict[Path, Tuple[TextIO, Any]] = {}
 
-def append_samples(file: Path, samples: List[Sample]) -> None:
-    ensure_header(file)
-    with file.open("a", newline="") as f:
+def _csv_writer(file: Path) -> Tuple[TextIO, Any]:
+    entry = _writer_cache.get(file)
+    if entry is None:
+        f = file.open("a", newline="")
         w = csv.writer(f)
-        for s in samples:
-            w.writerow(s.as_row())
+        # Append mode positions at EOF, so tell() == 0 means the file is new or
+        # empty and needs a header; no separate exists()/stat() needed.
+        if f.tell() == 0:
+            w.writerow(CSV_HEADER)
+        entry = _writer_cache[file] = (f, w)
+    return entry
 
-def read_samples(file: Path) -> List[Sample]:
+def close_writer(file: Path) -> None:
+    entry = _writer_cache.pop(file, None)
+    if entry is not None:
+        entry[0].close()
+
+def append_records(file: Path, records: List[Record], sync: bool = False) -> None:
+    f, w = _csv_writer(file)
+    w.writerows(records)
+    f.flush()
+    if sync:
+        os.fsync(f.fileno())
+
+def read_columns(file: Path) -> Columns:
+    """Read the CSV as parallel columns: (timestamps, metrics, values)."""
+    stamps = array("q")
+    metrics: List[str] = []
+    values = array("d")
     if not file.exists() or file.stat().st_size == 0:
-        return []
-    out: List[Sample] = []
+        return stamps, metrics, values
     with file.open("r", newline="") as f:
-        for row in csv.DictReader(f):
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
             try:
-                ts = dt.datetime.strptime(row["timestamp"], TIMESTAMP_FMT)
-                out.append(Sample(ts, row["metric"], float(row["value"])))
+                try:
+                    ts = int(row[0])
+                except ValueError:
+                    # Row written before timestamps were stored as epoch seconds
+                    ts = to_epoch(dt.datetime.fromisoformat(row[0]))
+                value = float(row[2])
+                # Interned, so repeated metric names share one string object
+                metric = sys.intern(row[1])
             except Exception:
                 continue
-    return out
+            stamps.append(ts)
+            metrics.append(metric)
+            values.append(value)
+    return stamps, metrics, values
 
 # ---------- Filtering & formatting ----------
+# Matches TIMESTAMP_FMT, "%Y-%m-%d %H:%M:%S" and "%Y-%m-%d" in one scan; like
+# strptime, the fields after the year may be one or two digits.
+TIME_RE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T](\d{1,2}):(\d{1,2}):(\d{1,2}))?")
+
 def parse_time(s: Optional[str]) -> Optional[dt.datetime]:
     if not s:
         return None
-    for fmt in (TIMESTAMP_FMT, "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+    m = TIME_RE.fullmatch(s)
+    if m:
         try:
-            return dt.datetime.strptime(s, fmt)
+            return dt.datetime(*map(int, m.groups(default="0")))
         except ValueError:
             pass
     raise argparse.ArgumentTypeError("Use e.g. 2025-09-27T15:30:00 or 2025-09-27")
 
-def filter_samples(items: List[Sample], metric: Optional[str],
-                   start: Optional[dt.datetime], end: Optional[dt.datetime]) -> List[Sample]:
-    res = []
-    for s in items:
-        if metric and s.metric != metric:
-            continue
-        if start and s.timestamp < start:
-            continue
-        if end and s.timestamp > end:
-            continue
-        res.append(s)
-    return res
+def filter_rows(cols: Columns, metric: Optional[str],
+                start: Optional[dt.datetime], end: Optional[dt.datetime]) -> List[Sample]:
+    """Samples matching metric and the time window, in one pass over the columns."""
+    lo = to_epoch(start) if start else None
+    hi = to_epoch(end) if end else None
+    return [Sample(t, m, v) for t, m, v in zip(*cols)
+            if (not metric or m == metric)
+            and (lo is None or t >= lo)
+            and (hi is None or t <= hi)]
 
 def fmt_table(rows: List[Tuple[str, str, str]]) -> str:
-    cols = ["timestamp", "metric", "value"]
-    widths = [max(len(cols[i]), max((len(r[i]) for r in rows), default=0)) for i in range(3)]
-    header = " | ".join(cols[i].ljust(widths[i]) for i in range(3))
+    if not rows:
+        return "(no data)"
+    widths = [len(c) for c in CSV_HEADER]
+    for r in rows:
+        for i, cell in enumerate(r):
+            if len(cell) > widths[i]:
+                widths[i] = len(cell)
+    line = "%%-%ds | %%-%ds | %%-%ds" % tuple(widths)
     sep = "-+-".join("-" * w for w in widths)
-    body = "\n".join(" | ".join(r[i].ljust(widths[i]) for i in range(3)) for r in rows)
-    return f"{header}\n{sep}\n{body}" if rows else "(no data)"
+    return "\n".join([line % CSV_HEADER, sep] + [line % r for r in rows])
 
 # ---------- Commands ----------
+def measure_all(metrics: List[str]) -> List[Record]:
+    # All metrics of one run share a timestamp: convert it once, not per row
+    ts = to_epoch(dt.datetime.now())
+    return [(ts, m, f"{KNOWN_METRICS[m]():.3f}") for m in metrics]
+
+def display_rows(records: List[Record]) -> List[Tuple[str, str, str]]:
+    return [(format_ts(r[0]), r[1], r[2]) for r in records]
+
+def _stop_loop(signum, frame) -> None:
+    raise KeyboardInterrupt
+
+def measure_loop(db: Path, metrics: List[str], interval: float, batch: int, verbose: bool) -> None:
+    """Sample every `interval` seconds until Ctrl-C/SIGTERM; write + fsync every `batch` rounds."""
+    pending: List[Record] = []
+    rounds = 0
+    next_tick = time.monotonic()
+    # systemd / docker stop send SIGTERM: stop like Ctrl-C so pending rows get flushed
+    prev_sigterm = signal.signal(signal.SIGTERM, _stop_loop)
+    try:
+        while True:
+            records = measure_all(metrics)
+            pending.extend(records)
+            rounds += 1
+            if verbose:
+                print(fmt_table(display_rows(records)))
+            if rounds % batch == 0:
+                # Detach before writing: a signal arriving mid-write must not
+                # make the finally block append the same rows again.
+                rows, pending = pending, []
+                append_records(db, rows, sync=True)
+            # Fixed-rate schedule; if sampling overran, start the next one now
+            now = time.monotonic()
+            next_tick = max(next_tick + interval, now)
+            time.sleep(max(0.0, next_tick - now))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, prev_sigterm)
+        if pending:
+            append_records(db, pending, sync=True)
+        close_writer(db)
+
 def cmd_measure(args: argparse.Namespace) -> None:
     db = Path(args.db)
     if args.reset and db.exists():
+        close_writer(db)
         db.unlink(missing_ok=True)
 
     unknown = [m for m in args.metrics if m not in KNOWN_METRICS]
     if unknown:
         raise SystemExit(f"Unknown: {', '.join(unknown)}. Known: {', '.join(KNOWN_METRICS)}")
 
-    now = dt.datetime.now()
-    samples = [Sample(now, m, KNOWN_METRICS[m]()) for m in args.metrics]
-    append_samples(db, samples)
+    if not args.loop:
+        if args.interval is not None or args.batch is not None:
+            raise SystemExit("--interval and --batch only apply with --loop")
+    else:
+        interval = DEFAULT_INTERVAL if args.interval is None else args.interval
+        batch = DEFAULT_BATCH if args.batch is None else args.batch
+        if batch < 1 or interval < 0:
+            raise SystemExit("--batch must be >= 1 and --interval >= 0")
+        measure_loop(db, args.metrics, interval, batch, args.verbose)
+        return
+
+    records = measure_all(args.metrics)
+    append_records(db, records)
 
     if args.verbose:
-        print(fmt_table([s.as_row() for s in samples]))
+        print(fmt_table(display_rows(records)))
 
 def cmd_show(args: argparse.Namespace) -> None:
-    items = read_samples(Path(args.db))
-    data = filter_samples(items, args.metric, parse_time(args.start), parse_time(args.end))
+    cols = read_columns(Path(args.db))
+    data = filter_rows(cols, args.metric, parse_time(args.start), parse_time(args.end))
     print(fmt_table([s.as_row() for s in data]))
 
-    if args.average and data:
-        avg = sum(s.value for s in data) / len(data)
-        print(f"\nAverage({args.metric or 'ALL'}) = {avg:.3f}")
-    if args.total and data:
-        total = sum(s.value for s in data)
-        print(f"Total({args.metric or 'ALL'}) = {total:.3f}")
+    values = [s.value for s in data]
+    if values:
+        # fsum: exact summation, no drift over long histories
+        total = math.fsum(values)
+        if args.average:
+            avg = total / len(values)
+            print(f"\nAverage({args.metric or 'ALL'}) = {avg:.3f}")
+        if args.total:
+            print(f"Total({args.metric or 'ALL'}) = {total:.3f}")
 
 # ---------- CLI ----------
 def build_parser() -> argparse.ArgumentParser:
@@ -142,6 +271,11 @@ def build_parser() -> argparse.ArgumentParser:
                    help=f"Choose from: {', '.join(KNOWN_METRICS)}")
     m.add_argument("--reset", action="store_true", help="Delete CSV before appending")
     m.add_argument("-v", "--verbose", action="store_true")
+    m.add_argument("--loop", action="store_true", help="Keep measuring until interrupted (Ctrl-C or SIGTERM)")
+    m.add_argument("--interval", type=float,
+                   help=f"With --loop, seconds between measurements (default: {DEFAULT_INTERVAL:g})")
+    m.add_argument("--batch", type=int,
+                   help=f"With --loop, write and fsync every N measurements (default: {DEFAULT_BATCH})")
     m.set_defaults(func=cmd_measure)
 
     s = sub.add_parser("show", help="Read CSV, filter/time window, show stats")
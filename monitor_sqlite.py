@@ -1,60 +1,146 @@
 #!/usr/bin/env python3
 import argparse
 import datetime as dt
+import re
 import sqlite3
 import socket
-import psutil
+import time
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 DEFAULT_DB = Path("metrics.db")
 ISO_FMT = "%Y-%m-%dT%H:%M:%SZ"
+ISO_TS_SQL = f"strftime('{ISO_FMT}', ts, 'unixepoch')"
+EXPORT_BATCH = 10_000
+DNS_TTL = 300.0  # seconds
+
+# host -> (monotonic time of lookup, IPv4 address)
+_dns_cache: Dict[str, Tuple[float, str]] = {}
+
+INSERT_SQL = "INSERT INTO sample (ts, host, ip, metric, value) VALUES (?, ?, ?, ?, ?);"
+
+# Same metric functions as monitor_cli.py; see the notes there.
+_CPU_PRIMED = False
+
+def metric_cpu_usage() -> float:
+    import psutil
+    global _CPU_PRIMED
+    if _CPU_PRIMED:
+        return float(psutil.cpu_percent(interval=None))
+    _CPU_PRIMED = True
+    return float(psutil.cpu_percent(interval=0.1))
+
+def metric_mem_usage() -> float:
+    import psutil
+    return float(psutil.virtual_memory().percent)
+
+def metric_disk0_usage() -> float:
+    import psutil
+    return float(psutil.disk_usage("/").percent)
 
 KNOWN_METRICS = {
-    "cpu-usage": lambda: float(psutil.cpu_percent(interval=0.1)),
-    "memory-usage": lambda: float(psutil.virtual_memory().percent),
-    "disk-0-usage": lambda: float(psutil.disk_usage("/").percent),
+    "cpu-usage": metric_cpu_usage,
+    "memory-usage": metric_mem_usage,
+    "disk-0-usage": metric_disk0_usage,
 }
 
 def utcnow() -> dt.datetime:
     return dt.datetime.now(dt.timezone.utc)
 
-def isoformat_utc(t: dt.datetime) -> str:
+def epoch_utc(t: dt.datetime) -> int:
     if t.tzinfo is None:
         t = t.replace(tzinfo=dt.timezone.utc)
-    else:
-        t = t.astimezone(dt.timezone.utc)
-    return t.strftime(ISO_FMT)
+    return int(t.timestamp())
 
-def open_db(path: Path) -> sqlite3.Connection:
+def open_db(path: Path, fast: bool = False) -> sqlite3.Connection:
     path.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(path, timeout=10, isolation_level=None)
     conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
+    # synchronous=OFF skips fsync entirely; only for bulk ingest where losing
+    # the last batch on power failure is acceptable.
+    conn.execute("PRAGMA synchronous=OFF;" if fast else "PRAGMA synchronous=NORMAL;")
+    # Read through a memory map (up to 1 GiB) and keep up to 64 MiB of pages cached
+    conn.execute("PRAGMA mmap_size=1073741824;")
+    conn.execute("PRAGMA cache_size=-65536;")
+    migrate_db(conn)
     return conn
 
+SAMPLE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS sample (
+        id     INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts     INTEGER NOT NULL,
+        host   TEXT    NOT NULL,
+        ip     TEXT    NOT NULL,
+        metric TEXT    NOT NULL,
+        value  REAL    NOT NULL
+    );
+"""
+SAMPLE_COLUMNS = [
+    ("id", "INTEGER"), ("ts", "INTEGER"), ("host", "TEXT"),
+    ("ip", "TEXT"), ("metric", "TEXT"), ("value", "REAL"),
+]
+
+# Old ts values are ISO-8601 text, or epoch seconds that landed in a TEXT column
+LEGACY_TS_SQL = """
+    CASE WHEN ts GLOB '[0-9]*' AND ts NOT GLOB '*[^0-9]*' THEN CAST(ts AS INTEGER)
+         ELSE CAST(strftime('%s', ts) AS INTEGER) END
+"""
+
+def migrate_db(conn: sqlite3.Connection) -> None:
+    """Rebuild a sample table created with TEXT timestamps as the current layout."""
+    cols = [(r[1], r[2].upper()) for r in conn.execute("PRAGMA table_info(sample);")]
+    if not cols or cols == SAMPLE_COLUMNS:
+        return
+    try:
+        with conn:
+            conn.execute("BEGIN;")
+            # Dropped first so the rename doesn't rewrite it to point at sample_old
+            conn.execute("DROP VIEW IF EXISTS sample_iso;")
+            conn.execute("ALTER TABLE sample RENAME TO sample_old;")
+            conn.execute(SAMPLE_TABLE_SQL)
+            conn.execute(
+                f"""
+                INSERT INTO sample (id, ts, host, ip, metric, value)
+                SELECT id, {LEGACY_TS_SQL}, host, ip, metric, value FROM sample_old
+                ORDER BY id;
+                """
+            )
+            conn.execute("DROP TABLE sample_old;")
+    except sqlite3.IntegrityError:
+        raise SystemExit("Cannot migrate sample table: it has ts values that are not timestamps")
+    init_db(conn)  # indexes and view
+
 def init_db(conn: sqlite3.Connection) -> None:
+    conn.execute(SAMPLE_TABLE_SQL)
+    # show filters on metric + ts: the aggregates and the min/max probe read only
+    # value/ts and are answered from this index alone; the listing also needs
+    # host/ip and still looks up each matching row. No query filters on host,
+    # so the old host-leading index is dropped.
+    conn.execute("DROP INDEX IF EXISTS idx_sample_host_metric_ts;")
     conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS sample (
-            id     INTEGER PRIMARY KEY AUTOINCREMENT,
-            ts     TEXT    NOT NULL,
-            host   TEXT    NOT NULL,
-            ip     TEXT    NOT NULL,
-            metric TEXT    NOT NULL,
-            value  REAL    NOT NULL
-        );
-        """
+        "CREATE INDEX IF NOT EXISTS idx_sample_metric_ts_value ON sample(metric, ts, value);"
     )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sample_ts ON sample(ts);")
+    # ts is stored as epoch seconds; this view renders it for humans.
     conn.execute(
-        "CREATE INDEX IF NOT EXISTS idx_sample_host_metric_ts ON sample(host, metric, ts);"
+        f"""
+        CREATE VIEW IF NOT EXISTS sample_iso AS
+        SELECT {ISO_TS_SQL} AS ts, host, ip, metric, value FROM sample;
+        """
     )
 
-def insert_sample(conn: sqlite3.Connection, ts: str, host: str, ip: str, metric: str, value: float):
-    conn.execute(
-        "INSERT INTO sample (ts, host, ip, metric, value) VALUES (?, ?, ?, ?, ?);",
-        (ts, host, ip, metric, value),
-    )
+def resolve(host: str) -> str:
+    """IPv4 address of host ("0.0.0.0" if it doesn't resolve), cached for DNS_TTL seconds."""
+    now = time.monotonic()
+    hit = _dns_cache.get(host)
+    if hit is not None and now - hit[0] < DNS_TTL:
+        return hit[1]
+    try:
+        ip = socket.getaddrinfo(host, None, socket.AF_INET)[0][4][0]
+    except socket.gaierror:
+        ip = "0.0.0.0"
+    _dns_cache[host] = (now, ip)
+    return ip
 
 def cmd_init(args):
     conn = open_db(Path(args.db))
@@ -62,70 +148,122 @@ def cmd_init(args):
     print(f"Database initialized at {args.db}")
 
 def cmd_measure(args):
-    conn = open_db(Path(args.db))
+    conn = open_db(Path(args.db), fast=args.fast)
     init_db(conn)
 
     host = socket.gethostname()
-    ip = socket.gethostbyname(host)
-    ts = isoformat_utc(utcnow())
+    ip = resolve(host)
+    now = utcnow()
+    ts = epoch_utc(now)
 
     for metric in args.metrics:
         if metric not in KNOWN_METRICS:
             print(f"Unknown metric: {metric}")
-            continue
-        value = KNOWN_METRICS[metric]()
-        insert_sample(conn, ts, host, ip, metric, value)
-        if args.verbose:
-            print(f"{ts} | {host} | {ip} | {metric} | {value:.2f}")
+    rows = [(ts, host, ip, m, KNOWN_METRICS[m]()) for m in args.metrics if m in KNOWN_METRICS]
+
+    # Autocommit connection: BEGIN explicitly so the whole batch is one
+    # transaction; the with-block commits it (or rolls back on error).
+    with conn:
+        conn.execute("BEGIN;")
+        conn.executemany(INSERT_SQL, rows)
+
+    if args.verbose:
+        for r in rows:
+            print(f"{now.strftime(ISO_FMT)} | {r[1]} | {r[2]} | {r[3]} | {r[4]:.2f}")
+
+def stored_range(conn: sqlite3.Connection, metric: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Oldest and newest ts stored (for one metric if given); (None, None) if empty."""
+    where, params = (" WHERE metric = ?", [metric]) if metric else ("", [])
+    # Separate MIN/MAX subqueries so each is a single index lookup
+    row = conn.execute(
+        f"SELECT (SELECT MIN(ts) FROM sample{where}), (SELECT MAX(ts) FROM sample{where})",
+        params * 2,
+    ).fetchone()
+    return row[0], row[1]
 
 def cmd_show(args):
     conn = open_db(Path(args.db))
-    sql = "SELECT ts, host, ip, metric, value FROM sample WHERE 1=1"
-    params: List[str] = []
+    # One read transaction, so the stored-range probe, the listing and the
+    # aggregates all see the same snapshot even while measure is inserting.
+    with conn:
+        conn.execute("BEGIN;")
+        show_samples(conn, args)
+
+def show_samples(conn: sqlite3.Connection, args) -> None:
+    where = " WHERE 1=1"
+    params: List = []
 
     if args.metric:
-        sql += " AND metric = ?"
+        where += " AND metric = ?"
         params.append(args.metric)
 
-    if args.start:
-        start_time = parse_relative_time(args.start)
-        sql += " AND ts >= ?"
-        params.append(isoformat_utc(start_time))
-
-    if args.end:
-        end_time = parse_relative_time(args.end)
-        sql += " AND ts <= ?"
-        params.append(isoformat_utc(end_time))
-
-    sql += " ORDER BY ts DESC"
+    start = epoch_utc(parse_relative_time(args.start)) if args.start else None
+    end = epoch_utc(parse_relative_time(args.end)) if args.end else None
+
+    if start is not None or end is not None:
+        # Clip the requested window to the stored one: no overlap means no
+        # query at all, and a bound that covers everything is dropped.
+        tmin, tmax = stored_range(conn, args.metric)
+        if (tmin is None
+                or (start is not None and start > tmax)
+                or (end is not None and end < tmin)
+                or (start is not None and end is not None and start > end)):
+            print("(no data)")
+            return
+        if start is not None and start > tmin:
+            where += " AND ts >= ?"
+            params.append(start)
+        if end is not None and end < tmax:
+            where += " AND ts <= ?"
+            params.append(end)
+
+    sql = f"SELECT {ISO_TS_SQL}, host, ip, metric, value FROM sample" + where + " ORDER BY ts DESC"
+    list_params = list(params)
     if args.limit:
         sql += " LIMIT ?"
-        params.append(args.limit)
+        list_params.append(int(args.limit))
 
-    rows = conn.execute(sql, params).fetchall()
-    for r in rows:
+    shown = 0
+    for r in conn.execute(sql, list_params):
         print(f"{r[0]} | {r[1]} | {r[2]} | {r[3]} | {r[4]:.2f}")
-
-    if args.average and rows:
-        values = [r[4] for r in rows]
-        avg = sum(values) / len(values)
-        print(f"\nAverage {args.metric}: {avg:.2f}")
+        shown += 1
+    if not shown:
+        print("(no data)")
+
+    if args.average or args.total:
+        # Let SQLite aggregate; with --limit only the listed rows count.
+        if args.limit:
+            agg_sql = f"SELECT AVG(value), SUM(value), COUNT(*) FROM ({sql})"
+            agg_params = list_params
+        else:
+            agg_sql = "SELECT AVG(value), SUM(value), COUNT(*) FROM sample" + where
+            agg_params = params
+        avg, total, count = conn.execute(agg_sql, agg_params).fetchone()
+        if count:
+            if args.average:
+                print(f"\nAverage {args.metric or 'ALL'}: {avg:.2f}")
+            if args.total:
+                print(f"Total {args.metric or 'ALL'}: {total:.2f}")
 
 def cmd_export(args):
     import csv
     conn = open_db(Path(args.db))
-    rows = conn.execute("SELECT ts, host, ip, metric, value FROM sample").fetchall()
+    cur = conn.execute("SELECT ts, host, ip, metric, value FROM sample_iso")
+    count = 0
 
     with open(args.out, "w", newline="") as f:
         writer = csv.writer(f)
         writer.writerow(["timestamp", "host", "ip", "metric", "value"])
-        writer.writerows(rows)
+        # Stream in batches so memory stays bounded regardless of table size
+        while rows := cur.fetchmany(EXPORT_BATCH):
+            writer.writerows(rows)
+            count += len(rows)
 
-    print(f"Exported {len(rows)} rows to {args.out}")
+    print(f"Exported {count} rows to {args.out}")
 
 def cmd_prune(args):
     conn = open_db(Path(args.db))
-    cutoff = isoformat_utc(utcnow() - dt.timedelta(days=args.retention_days))
+    cutoff = epoch_utc(utcnow() - dt.timedelta(days=args.retention_days))
     deleted = conn.execute("DELETE FROM sample WHERE ts < ?;", (cutoff,)).rowcount
     print(f"Deleted {deleted} rows older than {args.retention_days} days")
 
@@ -133,15 +271,17 @@ def cmd_prune(args):
         conn.execute("VACUUM;")
         print("Database vacuumed")
 
+RELATIVE_RE = re.compile(r"^-(\d+)([hdm])$")
+RELATIVE_UNITS = {
+    "h": dt.timedelta(hours=1),
+    "d": dt.timedelta(days=1),
+    "m": dt.timedelta(minutes=1),
+}
+
 def parse_relative_time(s: str) -> dt.datetime:
-    if s.startswith("-") and s[-1] in "hdm":
-        num = int(s[1:-1])
-        if s.endswith("h"):
-            return utcnow() - dt.timedelta(hours=num)
-        if s.endswith("d"):
-            return utcnow() - dt.timedelta(days=num)
-        if s.endswith("m"):
-            return utcnow() - dt.timedelta(minutes=num)
+    m = RELATIVE_RE.match(s)
+    if m:
+        return utcnow() - int(m.group(1)) * RELATIVE_UNITS[m.group(2)]
     return dt.datetime.fromisoformat(s).replace(tzinfo=dt.timezone.utc)
 
 def build_parser():
@@ -155,6 +295,7 @@ def build_parser():
     m = sub.add_parser("measure", help="Collect metrics")
     m.add_argument("--metrics", nargs="+", required=True, help=f"Choose from: {', '.join(KNOWN_METRICS)}")
     m.add_argument("-v", "--verbose", action="store_true")
+    m.add_argument("--fast", action="store_true", help="Use synchronous=OFF (bulk ingest, less durable)")
     m.set_defaults(func=cmd_measure)
 
     s = sub.add_parser("show", help="Show collected metrics")
@@ -163,6 +304,7 @@ def build_parser():
     s.add_argument("--end", help="End time")
     s.add_argument("--limit", type=int, help="Limit number of rows")
     s.add_argument("--average", action="store_true", help="Calculate average value")
+    s.add_argument("--total", action="store_true", help="Calculate total value")
     s.set_defaults(func=cmd_show)
 
     e = sub.add_parser("export", help="Export all data to CSV")